@@ -22,6 +22,11 @@ MavenBomInfo = provider(
     """,
 )
 
+# Jars are spread over this many licensetool runs by a hash of their
+# coordinates. Adding or bumping one jar then only re-runs the batch that
+# contains it, rather than the license lookup of every jar.
+_LICENSE_BATCH_COUNT = 32
+
 def _aggregate_maven_info(targets):
     return [
         target[MavenBomInfo].deploy_info
@@ -155,6 +160,7 @@ def _oss_audit_impl(ctx):
     submanifests = []
     submanifest_paths = []
     internal_jars = []
+    license_batches = {}
     for coord, jar_url, srcjar_url in sets.to_list(collected_data):
         name, version = coord.rsplit(":", 1)
         group_id, artifact_id = name.split(":", 1)
@@ -166,21 +172,15 @@ def _oss_audit_impl(ctx):
             continue
         license = ctx.actions.declare_file(coord + ".license")
         submanifest = ctx.actions.declare_file(coord + ".submanifest")
-        
-        # Decide whether to show progress when running license tool
-        progress_message = None
-        log_level = "WARNING"
-        if ctx.attr.debug:
-            progress_message = "Fetching license info {}".format(ctx.label)
-            log_level = "DEBUG"
-        
-        # Invoke _licensetool to produce .licence file that contains license metadata
-        ctx.actions.run(
-            outputs = [license],
-            executable = ctx.executable._licensetool,
-            arguments = [jar_url, license.path, "--log_level={}".format(log_level)],
-            progress_message = progress_message,
+
+        # The .license file that contains license metadata is produced by a
+        # batched _licensetool run below
+        batch_licenses, batch_lines = license_batches.setdefault(
+            hash(coord) % _LICENSE_BATCH_COUNT,
+            ([], []),
         )
+        batch_licenses.append(license)
+        batch_lines.append("{}\t{}".format(jar_url, license.path))
 
         # Load from .license file and produce .submanifest file with other info
         # for one maven jar
@@ -218,6 +218,38 @@ EOF
         submanifests.append(submanifest)
         submanifest_paths.append(submanifest.path)
 
+    # Decide whether to show progress when running license tool
+    progress_message = None
+    log_level = "WARNING"
+    if ctx.attr.debug:
+        progress_message = "Fetching license info {}".format(ctx.label)
+        log_level = "DEBUG"
+
+    # Invoke _licensetool once per batch to produce its .license files, so the
+    # interpreter startup and https setup are shared by the jars of a batch
+    for batch, (batch_licenses, batch_lines) in license_batches.items():
+        license_batch_file = ctx.actions.declare_file(
+            "{}.license_batch_{}".format(output_file_prefix, batch),
+        )
+        ctx.actions.write(
+            output = license_batch_file,
+            # Sorted so that the action key only changes with the batch members
+            content = "\n".join(sorted(batch_lines)) + "\n",
+        )
+        ctx.actions.run(
+            inputs = [license_batch_file],
+            outputs = batch_licenses,
+            executable = ctx.executable._licensetool,
+            arguments = [
+                "--batch",
+                license_batch_file.path,
+                "--log_level={}".format(log_level),
+            ],
+            progress_message = progress_message,
+            # Lets --action_env=LICENSETOOL_CACHE reach the .pom cache
+            use_default_shell_env = True,
+        )
+
     # Merge submanifest files into one bom file
     ctx.actions.run_shell(
         outputs = [merged_manifests_file],
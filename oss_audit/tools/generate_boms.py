@@ -25,6 +25,14 @@ This script is sourced from oss_audit.
 import sys
 import argparse
 import yaml
+from yaml.composer import Composer
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+_STR_TAG = "tag:yaml.org,2002:str"
 
 
 def main():
@@ -53,19 +61,16 @@ def main():
 
     approved_list = load_yaml_file(args.approved_list_path) if args.approved_list_path else {}
     denied_list = load_yaml_file(args.denied_list_path) if args.denied_list_path else {}
-    merged_manifest = load_yaml_file(args.merged_manifests_path)
+    merged_manifest = iter_yaml_mapping(args.merged_manifests_path)
 
     # All packages that are included in a target, irrespective of package status
     bom = create_bom(merged_manifest, approved_list, denied_list)
-    write_yaml(args.bom_path, bom)
 
-    # Packages that are denied or pending
-    issue_packages = set(bom) - set(approved_list)
-    bom_issues = {key: bom[key] for key in issue_packages}
-    write_yaml(args.bom_issues_path, bom_issues)
+    # The BOM-issues file gets the packages that are denied or pending
+    write_boms(args.bom_path, args.bom_issues_path, bom, approved_list)
 
     # Open source packages that are denied
-    denied_packages = set(denied_list).intersection(set(bom))
+    denied_packages = denied_list.keys() & bom.keys()
     unsuppressed = denied_packages.difference(args.suppress)
     if denied_packages:
         err_msg = """\
@@ -102,32 +107,35 @@ def create_bom(merged_manifest, approved_list, denied_list):
     'interaction_types', and 'resolution' will be copied over. Otherwise, these
     attributes will be added to the BOM with empty values.
 
+    The package mappings from merged_manifest are updated in place and become
+    the values of the returned BOM; nothing is copied.
+
     Args:
-        merged_manifest: dictionary representing all the packages used by a
-            project
+        merged_manifest: iterable of (key, package) pairs representing all the
+            packages used by a project, e.g. from iter_yaml_mapping
         denied_list: dictionary representing the denied packages
         approved_list: dictionary representing the approved packages
 
     Returns:
         Dictionary representing the BOM.
     """
-    resolved_packages = dict(list(approved_list.items()) + list(denied_list.items()))
-
-    bom = merged_manifest.copy()
-    for key in bom.keys():
-        package_info = {
-            "copyright_notices": "",
-            "interaction_types": [],
-            "resolution": "",
-        }
-        resolved_package = resolved_packages.get(key)
+    bom = {}
+    for key, package in merged_manifest:
         # standardize all version numbers to be strings
-        bom[key]["version"] = str(bom[key]["version"])
-        if resolved_package is not None:
-            for k in package_info.keys():
-                package_info[k] = resolved_package[k]
-
-        bom[key].update(package_info)
+        package["version"] = str(package["version"])
+        # a denied entry takes precedence over an approved one
+        resolved_package = denied_list.get(key)
+        if resolved_package is None:
+            resolved_package = approved_list.get(key)
+        if resolved_package is None:
+            package["copyright_notices"] = ""
+            package["interaction_types"] = []
+            package["resolution"] = ""
+        else:
+            package["copyright_notices"] = resolved_package["copyright_notices"]
+            package["interaction_types"] = resolved_package["interaction_types"]
+            package["resolution"] = resolved_package["resolution"]
+        bom[key] = package
 
     return bom
 
@@ -142,41 +150,145 @@ def load_yaml_file(file_path):
         Object representing the YAML file
     """
     with open(file_path, "r") as fp:
-        loaded_yaml = yaml.safe_load(fp)
+        loaded_yaml = yaml.load(fp, Loader=SafeLoader)
     return loaded_yaml or {}
 
 
-def write_yaml(file_path, packages):
-    """Dump dictionary into yaml file
+class _StreamingLoader(SafeLoader, Composer):
+    """SafeLoader that can compose a single node at a time
+
+    The libyaml-backed loader only exposes whole-document composition, so the
+    pure-Python Composer is mixed in to build one node from the event stream.
+    """
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.anchors = {}
 
-    Write the BOM or BOM-issues file by dumping a dictionary
-    of packages into a given file in YAML format. See module docstring
-    for description of output file contents.
+
+def iter_yaml_mapping(file_path):
+    """Iterate over the top-level mapping of a yaml file
+
+    Entries are parsed and yielded one at a time, so the whole document is
+    never held in memory as a single object.
 
     Args:
-        file_path - string of path to output file
-        packages - dictionary of packages to be dumped into a file
+        file_path: path of the yaml file to load
 
     Yields:
-        File with given dictionary in yaml format
+        (key, value) pairs of the top-level mapping. Nothing is yielded for an
+        empty file.
     """
+    with open(file_path, "r") as fp:
+        loader = _StreamingLoader(fp)
+        try:
+            loader.get_event()  # StreamStartEvent
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()  # DocumentStartEvent
+            if not loader.check_event(yaml.MappingStartEvent):
+                document = loader.construct_document(loader.compose_node(None, None))
+                yield from (document or {}).items()
+                return
+            loader.get_event()  # MappingStartEvent
+            while not loader.check_event(yaml.MappingEndEvent):
+                key = loader.construct_document(loader.compose_node(None, None))
+                value = loader.construct_document(loader.compose_node(None, None))
+                yield key, value
+        finally:
+            loader.dispose()
+
+
+def string_representer(dumper, data):
+    """Define YAML representer
+
+    This representer represents multi-line strings as YAML block scalar
+    literals while representing single-line strings as plain flow scalars.
+    Multi-line strings are expected to be normalized already, see
+    _normalize_multiline_strings.
+    """
+    return dumper.represent_scalar(
+        _STR_TAG, data, style="|" if "\n" in data else None
+    )
 
-    def string_representer(dumper, data):
-        """Define YAML representer
 
-        This representer represents multi-line strings as YAML block scalar
-        literals while representing single-line strings as plain flow scalars.
-        """
-        if "\n" in data:
-            return dumper.represent_scalar(
-                "tag:yaml.org,2002:str", data.replace("\r", "").strip(), style="|"
-            )
-        return dumper.represent_scalar("tag:yaml.org,2002:str", data)
+class _LiteralStringDumper(SafeDumper):
+    """SafeDumper writing multi-line strings with string_representer"""
+
+
+_LiteralStringDumper.add_representer(str, string_representer)
+
 
-    yaml.add_representer(str, string_representer)
+def _normalize_multiline_strings(data):
+    """Normalize multi-line strings in place for block literal output
 
-    with open(file_path, "w") as manifest:
-        yaml.dump(packages, manifest, default_flow_style=False, allow_unicode=True)
+    Carriage returns and surrounding whitespace are removed from every
+    multi-line string value found in the nested dicts and lists of data.
+
+    Returns:
+        True if any string value still spans multiple lines afterwards.
+    """
+    multiline = False
+    stack = [data]
+    while stack:
+        container = stack.pop()
+        if isinstance(container, dict):
+            items = container.items()
+        else:
+            items = enumerate(container)
+        for index, value in items:
+            if isinstance(value, str):
+                if "\n" in value:
+                    value = value.replace("\r", "").strip()
+                    container[index] = value
+                    multiline = multiline or "\n" in value
+            elif isinstance(value, (dict, list)):
+                stack.append(value)
+    return multiline
+
+
+def write_boms(bom_path, bom_issues_path, bom, approved_list):
+    """Dump the BOM and BOM-issues yaml files in a single pass
+
+    Write the BOM file with all packages of the bom dictionary and the
+    BOM-issues file with those that are not in the approved list. See module
+    docstring for description of output file contents.
+
+    Each package is encoded as YAML once, in key order, and the same text is
+    appended to both files when needed. Multi-line strings in bom are
+    normalized in place first. The custom string representer is only used
+    when some string needs to be written as a block literal; otherwise the
+    plain SafeDumper is used.
+
+    Args:
+        bom_path - string of path to output BOM file
+        bom_issues_path - string of path to output BOM-issues file
+        bom - dictionary of packages to be dumped into the files
+        approved_list - dictionary representing the approved packages
+
+    Yields:
+        Files with the BOM and BOM-issues packages in yaml format
+    """
+    dumper = _LiteralStringDumper if _normalize_multiline_strings(bom) else SafeDumper
+
+    with open(bom_path, "w") as bom_file, open(bom_issues_path, "w") as issues_file:
+        has_issues = False
+        for key in sorted(bom):
+            entry = yaml.dump(
+                {key: bom[key]},
+                Dumper=dumper,
+                default_flow_style=False,
+                allow_unicode=True,
+            )
+            bom_file.write(entry)
+            if key not in approved_list:
+                issues_file.write(entry)
+                has_issues = True
+
+        if not bom:
+            bom_file.write("{}\n")
+        if not has_issues:
+            issues_file.write("{}\n")
 
 
 if __name__ == "__main__":
@@ -34,75 +34,193 @@ So this tool can be used to generate the metadata:
         https://jcenter.bintray.com/com/google/code/findbugs/jsr305/3.0.2/jsr305-3.0.2.jar \
         path/to/output/file
 
+To collect the license metadata of many jars in one run, pass a batch file
+with one tab-separated "<jar url>\t<output file>" pair per line:
+
+    licensetool --batch path/to/batch/file
+
+When LICENSETOOL_CACHE is set to a directory, downloaded .pom files of
+released (non-SNAPSHOT) artifacts are cached there, since their content never
+changes. Only responses that parse as a .pom file are cached. Without
+LICENSETOOL_CACHE, or when it is empty, nothing is cached.
+
+Bazel actions only see LICENSETOOL_CACHE when it is passed with --action_env,
+and the directory must be writable from the sandbox, e.g.:
+
+    build --action_env=LICENSETOOL_CACHE=/path/to/cache
+    build --sandbox_writable_path=/path/to/cache
+
 """
 
 from __future__ import print_function
 
 import argparse
+import concurrent.futures
+import hashlib
 import logging
 import os
-import ssl
 import sys
-import time
-import re
-import urllib.request
-from urllib.error import URLError, HTTPError
+import tempfile
 from xml.etree import ElementTree as et
 
+import urllib3
 
-def collect_license(url, output):
-    """Fetch license metadata info using Jar location."""
+logger = logging.getLogger(__name__)
+
+# Default number of POM downloads in flight at once in batch mode
+_MAX_WORKERS = 16
+
+_RETRY_STATUS_CODES = frozenset((429, 502, 503, 504))
+
+# Connection errors, read errors, other errors and retryable status codes
+# each get up to 2 retries, and up to 10 redirects are followed. Retry-After
+# headers are ignored so that a single server cannot stall a whole batch.
+_RETRIES = urllib3.Retry(
+    total=None,
+    connect=2,
+    read=2,
+    status=2,
+    redirect=10,
+    other=2,
+    status_forcelist=_RETRY_STATUS_CODES,
+    backoff_factor=3,
+    respect_retry_after_header=False,
+)
+
+
+def build_pool_manager(maxsize=_MAX_WORKERS):
+    """Build the connection pool shared by all .pom downloads.
+
+    Connections are kept alive and reused across downloads from the same
+    host, keeping up to maxsize of them per host.
+    """
+    if os.environ.get("PYTHONHTTPSVERIFY", ""):
+        cert_reqs = "CERT_REQUIRED"
+    else:
+        cert_reqs = "CERT_NONE"
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=maxsize,
+        cert_reqs=cert_reqs,
+    )
+
+
+def _pom_cache_path(pom_url):
+    """Return the cache file path of a .pom url, or None if not cacheable."""
+    cache_dir = os.environ.get("LICENSETOOL_CACHE", "")
+    # SNAPSHOT artifacts can be republished under the same url
+    if not cache_dir or "-SNAPSHOT" in pom_url:
+        return None
+    key = hashlib.blake2b(pom_url.encode(), digest_size=16).hexdigest()
+    return os.path.join(os.path.expanduser(cache_dir), key + ".pom")
 
-    retry_status_codes = [429, 502, 503, 504]
+
+def _read_cached_pom(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_cached_pom(cache_path, data):
+    # Write to a temporary file first so that concurrent readers never see a
+    # partially written .pom
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # mkstemp creates the file as 0600; let other users of a shared
+            # cache read it
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        logger.debug("Unable to cache .pom in %s: %s", cache_dir, e)
+
+
+def collect_license(url, output, http=None):
+    """Fetch license metadata info using Jar location."""
 
     def _get_namespace(element):
-        m = re.match("\{.*\}", element.tag)
-        return m.group(0) if m else ""
+        tag = element.tag
+        if tag.startswith("{"):
+            return tag[: tag.index("}") + 1]
+        return ""
 
     def _write_file(output, content):
         with open(output, "w") as f:
             f.write(content + "\n")
 
-    def _request_pom(pom_url, tries=3):
-        logging.debug("Downloading .pom from: {}".format(pom_url))
-        for i in range(tries):
-            try:
-                return urllib.request.urlopen(pom_url)
-            except HTTPError as e:
-                logging.debug(
-                    "Download failed: {}: {} {}".format(pom_url, e.code, e.reason)
-                )
-                if e.code not in retry_status_codes or i >= tries - 1:
-                    break
-            except URLError as e:
-                logging.debug("Download failed: {}: {}".format(pom_url, e.reason))
-
-            if i < tries - 1:
-                logging.debug("Retrying in 3 seconds...")
-                time.sleep(3)
-
-        raise Exception("Unable to download .pom from: {}".format(pom_url))
-
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(levelname)s: %(message)s",
-    )
+    def _request_pom(pom_url):
+        logger.debug("Downloading .pom from: %s", pom_url)
+        try:
+            response = http.request("GET", pom_url, retries=_RETRIES)
+        except urllib3.exceptions.HTTPError as e:
+            logger.debug("Download failed: %s: %s", pom_url, e)
+            raise Exception("Unable to download .pom from: {}".format(pom_url))
+
+        if response.status != 200:
+            logger.debug(
+                "Download failed: %s: %s %s", pom_url, response.status, response.reason
+            )
+            raise Exception("Unable to download .pom from: {}".format(pom_url))
+        return response.data
+
+    def _parse_licenses(pom):
+        # The whole .pom is already in memory, so parse it in one go and look
+        # up <project>/<licenses>/<license>/<name> lazily
+        root = et.fromstring(pom)
+        namespace = _get_namespace(root)
+        if root.tag != namespace + "project":
+            raise ValueError("Not a .pom file, root element is: {}".format(root.tag))
+        path = "./{0}licenses/{0}license/{0}name".format(namespace)
+        return [item.text for item in root.iterfind(path)]
+
+    def _get_licenses(pom_url):
+        cache_path = _pom_cache_path(pom_url)
+        if cache_path is not None:
+            data = _read_cached_pom(cache_path)
+            if data is not None:
+                try:
+                    names = _parse_licenses(data)
+                except (et.ParseError, ValueError) as e:
+                    logger.debug("Ignoring invalid cached .pom for: %s: %s", pom_url, e)
+                else:
+                    logger.debug("Using cached .pom for: %s", pom_url)
+                    return names
+
+        data = _request_pom(pom_url)
+        names = _parse_licenses(data)
+        # Only cache what parsed as a .pom, so an error page or a truncated
+        # download is never reused
+        if cache_path is not None:
+            _write_cached_pom(cache_path, data)
+        return names
 
     if not url:
-        logging.debug("Empty url, setting license value to 'UNKNOWN'")
+        logger.debug("Empty url, setting license value to 'UNKNOWN'")
         _write_file(output, "UNKNOWN")
         return
 
-    if not os.environ.get("PYTHONHTTPSVERIFY", "") and getattr(
-        ssl, "_create_unverified_context", None
-    ):
-        ssl._create_default_https_context = ssl._create_unverified_context
+    if http is None:
+        http = build_pool_manager()
 
     try:
         # generate .pom file location
-        path, jar_filename = url.rsplit("/", 1)
-        pom_filename = jar_filename.replace(".jar", ".pom")
-        pom_url = os.path.join(path, pom_filename)
+        jar_url, query_sep, query = url.partition("?")
+        if jar_url.endswith(".jar"):
+            pom_url = jar_url[: -len(".jar")] + ".pom"
+        else:
+            path, jar_filename = jar_url.rsplit("/", 1)
+            pom_url = path + "/" + jar_filename.rsplit(".", 1)[0] + ".pom"
+        pom_url += query_sep + query
 
         # Parse for licence element and convert as dict <key, value> pair
         # <licenses>
@@ -112,22 +230,18 @@ def collect_license(url, output):
         #      <distribution>repo</distribution>
         #   </license>
         # </licenses>
-        tree = et.ElementTree()
-        pom = _request_pom(pom_url)
-        tree.parse(pom)
-        namespace = _get_namespace(tree.getroot())
-        names = tree.findall("./{0}licenses/{0}license/{0}name".format(namespace))
-        licenses = ";".join([item.text for item in names])
+        names = _get_licenses(pom_url)
+        licenses = ";".join([name for name in names if name])
     except Exception as e:
         _write_file(output, "UNKNOWN")
-        logging.info("Setting license value to 'UNKNOWN'. Reason: \n\t{}".format(e))
+        logger.info("Setting license value to 'UNKNOWN'. Reason: \n\t%s", e)
         return
 
     # For the case when no license metadata found in .pom file, license
     # defaults to 'UNKNOWN'
     if not licenses:
         licenses = "UNKNOWN"
-        logging.debug(
+        logger.debug(
             "No license metadata found in .pom file, setting license value to 'UNKNOWN'"
         )
     _write_file(output, licenses)
@@ -137,13 +251,52 @@ def main():
     parser = argparse.ArgumentParser(
         description=__doc__.split("\n")[0], fromfile_prefix_chars="@"
     )
-    parser.add_argument("url", help="Jar file location url")
-    parser.add_argument("output", help="Output file")
+    parser.add_argument("url", nargs="?", help="Jar file location url")
+    parser.add_argument("output", nargs="?", help="Output file")
+    parser.add_argument(
+        "--batch",
+        help="File with one tab-separated '<url>\\t<output>' pair per line",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=_MAX_WORKERS,
+        help="Number of .pom files downloaded concurrently in batch mode",
+    )
     parser.add_argument("--log_level", required=False, default="WARNING",help="Provide logging level. Example --log_level DEBUG', default='WARNING'")
 
     args = parser.parse_args()
+    if args.batch and args.url is not None:
+        parser.error("url and output cannot be used together with --batch")
+    if not args.batch and args.output is None:
+        parser.error("either url and output, or --batch, is required")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
     logging.basicConfig(level=args.log_level)
-    collect_license(args.url, args.output)
+    http = build_pool_manager(maxsize=args.jobs)
+    if args.batch:
+        jobs = []
+        with open(args.batch, "r") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                job = line.rstrip("\n").split("\t", 1)
+                if len(job) != 2:
+                    parser.error(
+                        "{}:{}: expected '<url>\\t<output>'".format(
+                            args.batch, line_number
+                        )
+                    )
+                jobs.append(job)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [
+                executor.submit(collect_license, url, output, http)
+                for url, output in jobs
+            ]
+            for future in futures:
+                future.result()
+    else:
+        collect_license(args.url, args.output, http)
 
 
 if __name__ == "__main__":